@@ -15,16 +15,17 @@ def load_player_data(json_file: str) -> pd.DataFrame:
     :param json_file: Path to json file
     :return: Dataframe with player data
     """
-    df = pd.read_json(json_file)
+    df = pd.read_json(json_file, convert_dates=False)
 
     # Delete transactions with error
     print(f"Deleting {df[df['isError'] == 1].shape[0]} records from player data, where transaction was an error")
     df = df[df['isError'] == 0]
 
-    df = df.drop(columns=['blockNumber', 'timeStamp', 'hash', 'nonce', 'blockHash',
+    df = df.drop(columns=['hash', 'nonce', 'blockHash',
                           'transactionIndex', 'from', 'to', 'value', 'gas', 'gasPrice', 'isError',
                           'txreceipt_status', 'contractAddress', 'cumulativeGasUsed',
                           'gasUsed', 'confirmations', 'methodId', 'input'])
+    df[['blockNumber', 'timeStamp']] = df[['blockNumber', 'timeStamp']].astype(int)
     df = df.sort_values('epoch')
 
     return df
@@ -75,13 +76,14 @@ def analyze_player(player_df: pd.DataFrame, rounds_df: pd.DataFrame, check_from:
         print(f"Checking only transactions after"
               f" {datetime.datetime.utcfromtimestamp(check_from).strftime('%Y-%m-%d %H:%M:%S')}")
 
-    return final_df[['epoch', 'player_bet', 'bet_amount']]
+    return final_df[['epoch', 'player_bet', 'bet_amount', 'timeStamp', 'blockNumber']]
 
 
 def create_final_csv_files(player_data_dir: str, final_data_dir: str, rounds_df: pd.DataFrame,
                            check_from: int = None) -> None:
     """
-    Create final csv file with player bets and rounds data merged
+    Create final csv files with player bets and rounds data merged and the timeline of all the bets (with the bet
+    timestamp and block number, used to replay the pools)
     :param final_data_dir: Directory to save the final CSV files
     :param player_data_dir: Directory with player data JSON files
     :param rounds_df: Dataframe with rounds data
@@ -94,6 +96,7 @@ def create_final_csv_files(player_data_dir: str, final_data_dir: str, rounds_df:
 
     merged_player_bet = rounds_df.copy()
     merged_bet_amount = rounds_df.copy()
+    bets_timeline = []
 
     for player_data_file in player_data_files:
         print(f"Analyzing {player_data_file}")
@@ -109,6 +112,10 @@ def create_final_csv_files(player_data_dir: str, final_data_dir: str, rounds_df:
         merged_player_bet = merged_player_bet.rename(columns={'player_bet': filename})
         merged_bet_amount = merged_bet_amount.rename(columns={'bet_amount': filename})
 
+        calculated_player_df = calculated_player_df.copy()
+        calculated_player_df['player'] = filename
+        bets_timeline.append(calculated_player_df)
+
     merged_player_bet.set_index('epoch', inplace=True)
     merged_bet_amount.set_index('epoch', inplace=True)
 
@@ -119,6 +126,9 @@ def create_final_csv_files(player_data_dir: str, final_data_dir: str, rounds_df:
     merged_player_bet.to_csv(final_data_dir + 'final_player_bet.csv')
     merged_bet_amount.to_csv(final_data_dir + 'final_bet_amount.csv')
 
+    bets_timeline_df = pd.concat(bets_timeline).sort_values(['epoch', 'timeStamp', 'blockNumber'])
+    bets_timeline_df.to_csv(final_data_dir + 'final_bets_timeline.csv', index=False)
+
 
 if __name__ == "__main__":
     # Downloading players bet history settings
@@ -0,0 +1,159 @@
+"""Replay the pools of the rounds from the bets timeline and simulate betting at a given time before the lock"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from simulator import simulate
+from utils import load_bets_timeline, load_players_data
+
+
+def get_pool_at_time(data_df: pd.DataFrame, bets_df: pd.DataFrame, seconds_before_lock: int = 10,
+                     untracked: str = 'scale', min_tracked_share: float = 0.2) -> pd.DataFrame:
+    """
+    Rebuild the bull and bear pools of each round at the decision time (lock_timestamp - seconds_before_lock). Only the
+    bets of the tracked wallets have timestamps, the rest of the final pool (untracked money) is added depending on
+    the untracked param:
+    'scale' - untracked money arrives at the same pace as the tracked money (tracked pool is scaled to the final pool)
+    'early' - all the untracked money arrives before the decision time, only the tracked late bets are removed
+    A few tracked bets do not show the pace of the whole side, so in 'scale' mode the estimate moves linearly from
+    the 'early' one (no tracked bets) to the scaled one (tracked bets make at least min_tracked_share of the side).
+    Rounds without tracked bets on a side keep the final amount of that side
+    :param data_df: Dataframe with cols: epoch, lock_timestamp, bull_amount, bear_amount (can be player_bet_df)
+    :param bets_df: Dataframe with the bets timeline (see utils.load_bets_timeline)
+    :param seconds_before_lock: Number of seconds before the lock_timestamp when the bet is placed
+    :param untracked: How to add the untracked money - 'scale' or 'early'
+    :param min_tracked_share: Share of the final side amount made by the tracked bets needed to fully trust the
+    'scale' estimate
+    :return: Dataframe with cols: epoch, decision_timestamp, bull_amount, bear_amount, total_amount, bull_multiplier,
+    bear_multiplier at the decision time, with the same index as data_df
+    """
+    if untracked not in ['scale', 'early']:
+        raise ValueError(f"Unknown untracked param: {untracked}, use 'scale' or 'early'")
+
+    epochs = data_df['epoch'].to_numpy()
+    decision_timestamps = data_df['lock_timestamp'].to_numpy(dtype=np.int64) - seconds_before_lock
+
+    pool_df = pd.DataFrame({'epoch': epochs, 'decision_timestamp': decision_timestamps}, index=data_df.index)
+
+    bets_df = bets_df[bets_df['epoch'].isin(epochs)]
+
+    for side in ['Bull', 'Bear']:
+        side_bets_df = bets_df[bets_df['player_bet'] == side].sort_values(['epoch', 'timeStamp'])
+
+        # Epoch number and timestamp in one sortable int64 key (timestamps fit in 32 bits), so the pool of all the
+        # epochs at their decision times can be found with a single searchsorted
+        bets_keys = side_bets_df['epoch'].to_numpy(dtype=np.int64) * 2 ** 32 \
+            + side_bets_df['timeStamp'].to_numpy(dtype=np.int64)
+        cumulative_amounts = side_bets_df.groupby('epoch')['bet_amount'].cumsum().to_numpy()
+        decision_keys = epochs.astype(np.int64) * 2 ** 32 + decision_timestamps
+
+        last_bet_index = np.searchsorted(bets_keys, decision_keys, side='right') - 1
+
+        # Cumulative tracked amount at the decision time, 0 if the last earlier bet belongs to a previous epoch
+        tracked_at_time = np.zeros(len(epochs))
+        if len(side_bets_df) > 0:
+            in_epoch = (last_bet_index >= 0) & (bets_keys[last_bet_index] // 2 ** 32 == epochs)
+            tracked_at_time[in_epoch] = cumulative_amounts[last_bet_index[in_epoch]]
+
+        tracked_total = side_bets_df.groupby('epoch')['bet_amount'].sum().reindex(epochs, fill_value=0).to_numpy()
+
+        final_amount = data_df[f'{side.lower()}_amount'].to_numpy(dtype=float)
+
+        amount = final_amount - tracked_total + tracked_at_time
+
+        if untracked == 'scale':
+            scaled_amount = np.where(tracked_total > 0,
+                                     tracked_at_time * final_amount / np.where(tracked_total > 0, tracked_total, 1),
+                                     final_amount)
+
+            tracked_share = np.where(final_amount > 0, tracked_total / np.where(final_amount > 0, final_amount, 1), 0)
+            scale_weight = np.clip(tracked_share / min_tracked_share, 0, 1) if min_tracked_share > 0 else 1
+
+            amount = scale_weight * scaled_amount + (1 - scale_weight) * amount
+
+        pool_df[f'{side.lower()}_amount'] = amount
+
+    pool_df['total_amount'] = pool_df['bull_amount'] + pool_df['bear_amount']
+
+    pool_df['bull_multiplier'] = np.where(pool_df['bull_amount'] > 0,
+                                          pool_df['total_amount'] / pool_df['bull_amount'],
+                                          1)
+
+    pool_df['bear_multiplier'] = np.where(pool_df['bear_amount'] > 0,
+                                          pool_df['total_amount'] / pool_df['bear_amount'],
+                                          1)
+
+    return pool_df
+
+
+def simulate_at_decision_time(data_df: pd.DataFrame, bets_df: pd.DataFrame, prediction: pd.Series,
+                              bet_size: pd.Series, seconds_before_lock: int = 10, min_multiplier: float = 0,
+                              untracked: str = 'scale', min_tracked_share: float = 0.2) -> pd.DataFrame:
+    """
+    Simulate the bet game when the bets are placed seconds before the lock. The min_multiplier is checked against the
+    multiplier seen at the decision time (with our bet added), the payout uses the final pools, so the money arriving
+    after our bet moves the multiplier (slippage). The rounds without a prediction, with no bet size or skipped because
+    of the min_multiplier keep their prediction and bet_size, have profit 0 and placed_bet False
+    :param data_df: Dataframe with cols: epoch, lock_timestamp, position, bull_amount, bear_amount, total_amount
+    :param bets_df: Dataframe with the bets timeline (see utils.load_bets_timeline)
+    :param prediction: Series with predictions for each epoch
+    :param bet_size: Series (or a number) with bet sizes (in CAKE tokens) for each epoch. 0 means no bet
+    :param seconds_before_lock: Number of seconds before the lock_timestamp when the bet is placed
+    :param min_multiplier: Minimum multiplier (seen at the decision time) to bet
+    :param untracked: How to add the untracked money - 'scale' or 'early' (see get_pool_at_time)
+    :param min_tracked_share: Share of the side needed to fully trust the 'scale' estimate (see get_pool_at_time)
+    :return: Dataframe with the simulation results (in CAKE tokens) and cols: placed_bet and decision_multiplier,
+    final_multiplier, slippage for the predicted side
+    """
+    pool_df = get_pool_at_time(data_df, bets_df, seconds_before_lock, untracked, min_tracked_share)
+
+    # Align by the index labels, as simulate does
+    prediction = prediction.reindex(data_df.index)
+    bet_size = pd.Series(bet_size, index=data_df.index, dtype=float)
+
+    predicted_bull = prediction.isin(['Bull', 1]).to_numpy()
+    predicted_bear = prediction.isin(['Bear', 0]).to_numpy()
+
+    # Multiplier of the predicted side with our bet added to the pool
+    decision_total = pool_df['total_amount'] + bet_size
+    decision_multiplier = np.where(predicted_bull, decision_total / (pool_df['bull_amount'] + bet_size), np.nan)
+    decision_multiplier = np.where(predicted_bear, decision_total / (pool_df['bear_amount'] + bet_size),
+                                   decision_multiplier)
+
+    final_total = data_df['bull_amount'] + data_df['bear_amount'] + bet_size
+    final_multiplier = np.where(predicted_bull, final_total / (data_df['bull_amount'] + bet_size), np.nan)
+    final_multiplier = np.where(predicted_bear, final_total / (data_df['bear_amount'] + bet_size), final_multiplier)
+
+    simulation_df = simulate(data_df[['epoch', 'position', 'bull_amount', 'bear_amount', 'total_amount']],
+                             prediction, bet_size, add_bet_to_pool=True)
+
+    # Do not place bets without a prediction, with no bet size or when the multiplier seen at the decision time is
+    # below the min_multiplier
+    placed_bet = prediction.notna().to_numpy() & (bet_size > 0).to_numpy() & ~(decision_multiplier < min_multiplier)
+    simulation_df['placed_bet'] = placed_bet
+    simulation_df['profit'] = np.where(placed_bet, simulation_df['profit'], 0)
+
+    simulation_df['decision_multiplier'] = decision_multiplier
+    simulation_df['final_multiplier'] = final_multiplier
+    simulation_df['slippage'] = simulation_df['final_multiplier'] - simulation_df['decision_multiplier']
+
+    return simulation_df
+
+
+if __name__ == "__main__":
+    time_from_training = int(datetime.datetime(2022, 10, 28, 0, 0).timestamp())
+    time_to_training = int(datetime.datetime(2022, 12, 28, 0, 0).timestamp())
+
+    player_bet_df, bet_amount_df = load_players_data(time_from_training, time_to_training)
+    bets_df = load_bets_timeline(time_from_training, time_to_training)
+
+    # Bet 1 CAKE on the side with less money 10 seconds before the lock
+    pool_df = get_pool_at_time(player_bet_df, bets_df, seconds_before_lock=10)
+    prediction = pd.Series(np.where(pool_df['bull_amount'] < pool_df['bear_amount'], 'Bull', 'Bear'),
+                           index=player_bet_df.index)
+
+    simulation_df = simulate_at_decision_time(player_bet_df, bets_df, prediction, 1, seconds_before_lock=10,
+                                              min_multiplier=2)
+    simulation_df = simulation_df[simulation_df['placed_bet']]
+
+    print(f"Profit: {simulation_df['profit'].sum()}, mean slippage: {simulation_df['slippage'].mean()}")
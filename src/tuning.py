@@ -0,0 +1,208 @@
+"""Hyperparameter search with successive halving on time ordered folds, scored by the simulated profit"""
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+
+from simulator import simulate
+
+# Data shared by the worker processes. It is set once per process, so the feature matrices are not sent with every trial
+worker_data = {}
+
+
+def init_worker(x: np.ndarray, y: np.ndarray, folds: list) -> None:
+    """
+    Store the feature matrix, the labels and the folds in the worker process
+    :param x: Feature matrix
+    :param y: Labels (0 - Bear, 1 - Bull)
+    :param folds: List of (train_index, test_index) tuples
+    :return: None
+    """
+    worker_data['x'] = x
+    worker_data['y'] = y
+    worker_data['folds'] = folds
+
+
+def fit_predict_fold(estimator, fold_index: int) -> np.ndarray:
+    """
+    Fit the estimator on the train part of the fold and predict the Bull probability on the test part
+    :param estimator: Sklearn classifier (not fitted)
+    :param fold_index: Index of the fold
+    :return: Array with the Bull probability for each test epoch
+    """
+    train_index, test_index = worker_data['folds'][fold_index]
+
+    clf = clone(estimator)
+    clf.fit(worker_data['x'][train_index], worker_data['y'][train_index])
+
+    # The first (shortest) training windows can contain only one class
+    if 1 not in clf.classes_:
+        return np.zeros(len(test_index))
+
+    predicted_probability = clf.predict_proba(worker_data['x'][test_index])
+
+    return predicted_probability[:, list(clf.classes_).index(1)]
+
+
+def get_simulated_profit(bull_probability: np.ndarray, data_df: pd.DataFrame, threshold: float, bet_size: float = 1,
+                         min_multiplier: float = 0) -> float:
+    """
+    Bet on the rounds where the predicted probability is above the threshold and get the simulated profit
+    :param bull_probability: Array with the Bull probability for each epoch
+    :param data_df: Dataframe with cols: position, bull_amount, bear_amount, total_amount
+    :param threshold: Minimum probability to place a bet
+    :param bet_size: Bet size (in CAKE tokens)
+    :param min_multiplier: Minimum multiplier of the predicted side (with the bet added) to bet
+    :return: Total profit (in CAKE tokens)
+    """
+    prediction = np.where(bull_probability > threshold, 1, np.nan)
+    prediction = np.where(1 - bull_probability > threshold, 0, prediction)
+
+    # Multiplier of the predicted side with our bet added. simulate checks the min_multiplier on the winning side,
+    # which would use the round outcome, so the bets are filtered here
+    total_amount = data_df['bull_amount'] + data_df['bear_amount'] + bet_size
+    own_multiplier = np.where(prediction == 1, total_amount / (data_df['bull_amount'] + bet_size),
+                              total_amount / (data_df['bear_amount'] + bet_size))
+    prediction = np.where(own_multiplier < min_multiplier, np.nan, prediction)
+
+    simulation_df = simulate(data_df, pd.Series(prediction, index=data_df.index), bet_size=bet_size,
+                             add_bet_to_pool=True, min_multiplier=0)
+
+    # Drop rows where prediction is null
+    simulation_df = simulation_df[simulation_df['prediction'].notna()]
+
+    return simulation_df['profit'].sum()
+
+
+def sample_candidates(estimator, param_distributions: dict, n_iter: int, threshold_list: list = (0.7,),
+                      min_multiplier_list: list = (0,), random_state: int = None) -> list:
+    """
+    Sample the candidate configurations. Candidates differing only in threshold or min_multiplier share the estimator
+    object, so it is fitted only once per fold
+    :param estimator: Sklearn classifier to tune
+    :param param_distributions: Dict with lists or scipy distributions of the estimator params
+    :param n_iter: Number of estimator params to sample
+    :param threshold_list: Thresholds to check for each estimator
+    :param min_multiplier_list: Min multipliers to check for each estimator
+    :param random_state: Random state of the sampler (optional)
+    :return: List of dicts with estimator, threshold and min_multiplier
+    """
+    candidates = []
+    for params in ParameterSampler(param_distributions, n_iter, random_state=random_state):
+        clf = clone(estimator).set_params(**params)
+        for threshold in threshold_list:
+            for min_multiplier in min_multiplier_list:
+                candidates.append({'estimator': clf, 'threshold': threshold, 'min_multiplier': min_multiplier})
+
+    return candidates
+
+
+def successive_halving(candidates: list, features_df: pd.DataFrame, amount_data_df: pd.DataFrame, n_splits: int = 10,
+                       min_folds: int = 1, eta: int = 3, bet_size: float = 1, max_workers: int = None) -> pd.DataFrame:
+    """
+    Successive halving search. All candidates are scored on the first (cheapest, shortest training) time ordered folds,
+    only the best 1/eta of them are evaluated on eta times more folds, until the best ones are scored on all the folds.
+    The score is the mean simulated profit per fold
+    :param candidates: List of dicts with estimator, threshold and min_multiplier (see sample_candidates)
+    :param features_df: Dataframe with the features and the position column (0 - Bear, 1 - Bull), indexed by epoch
+    :param amount_data_df: Dataframe with cols: bull_amount, bear_amount, total_amount (not scaled), indexed by epoch
+    :param n_splits: Number of time ordered folds
+    :param min_folds: Number of folds evaluated in the first rung
+    :param eta: Only 1/eta of the candidates are promoted to the next rung
+    :param bet_size: Bet size (in CAKE tokens)
+    :param max_workers: Number of worker processes (optional, number of CPUs by default)
+    :return: Dataframe with the results for each candidate, the best ones first
+    """
+    if eta < 2:
+        raise ValueError(f"Wrong eta param: {eta}, use at least 2")
+    if min_folds < 1:
+        raise ValueError(f"Wrong min_folds param: {min_folds}, use at least 1")
+
+    x = features_df.drop(columns=['position']).to_numpy(dtype=float)
+    y = features_df['position'].to_numpy(dtype=int)
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(x))
+
+    simulation_data_df = amount_data_df.loc[features_df.index, ['bull_amount', 'bear_amount', 'total_amount']].copy()
+    simulation_data_df['position'] = y
+
+    estimators = {id(candidate['estimator']): candidate['estimator'] for candidate in candidates}
+    bull_probabilities = {}  # (estimator id, fold index) -> Bull probability on the fold test epochs
+    profits = {}  # (candidate index, fold index) -> simulated profit
+
+    results = [{'classifier': str(candidate['estimator']), 'threshold': candidate['threshold'],
+                'min_multiplier': candidate['min_multiplier'], 'rung': 0, 'number_of_folds': 0, 'profit': np.nan}
+               for candidate in candidates]
+
+    alive = list(range(len(candidates)))
+    number_of_folds = min(min_folds, n_splits)
+    rung = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                                initargs=(x, y, folds)) as executor:
+        while True:
+            print(f"Rung {rung}: {len(alive)} candidates, {number_of_folds} folds")
+
+            # Fit only the estimators and folds not evaluated in the previous rungs
+            futures = {}
+            for candidate_index in alive:
+                key = id(candidates[candidate_index]['estimator'])
+                for fold_index in range(number_of_folds):
+                    if (key, fold_index) not in bull_probabilities and (key, fold_index) not in futures:
+                        futures[(key, fold_index)] = executor.submit(fit_predict_fold, estimators[key], fold_index)
+
+            for key, future in futures.items():
+                bull_probabilities[key] = future.result()
+
+            for candidate_index in alive:
+                candidate = candidates[candidate_index]
+                for fold_index in range(number_of_folds):
+                    if (candidate_index, fold_index) not in profits:
+                        test_index = folds[fold_index][1]
+                        profits[(candidate_index, fold_index)] = get_simulated_profit(
+                            bull_probabilities[(id(candidate['estimator']), fold_index)],
+                            simulation_data_df.iloc[test_index], candidate['threshold'], bet_size,
+                            candidate['min_multiplier'])
+
+                results[candidate_index]['rung'] = rung
+                results[candidate_index]['number_of_folds'] = number_of_folds
+                results[candidate_index]['profit'] = np.mean([profits[(candidate_index, fold_index)]
+                                                              for fold_index in range(number_of_folds)])
+
+            if number_of_folds == n_splits:
+                break
+
+            # Stop the unpromising candidates
+            alive = sorted(alive, key=lambda i: results[i]['profit'], reverse=True)[:max(1, len(alive) // eta)]
+            number_of_folds = n_splits if len(alive) == 1 else min(number_of_folds * eta, n_splits)
+            rung += 1
+
+    df = pd.DataFrame(results)
+    return df.sort_values(by=['rung', 'profit'], ascending=False)
+
+
+if __name__ == "__main__":
+    import datetime
+
+    from sklearn.ensemble import RandomForestClassifier
+
+    from utils import load_players_data
+
+    time_from_training = int(datetime.datetime(2022, 10, 28, 0, 0).timestamp())
+    time_to_training = int(datetime.datetime(2022, 12, 28, 0, 0).timestamp())
+
+    player_bet_df, bet_amount_df = load_players_data(time_from_training, time_to_training)
+    player_bet_df = player_bet_df.set_index('epoch')
+    player_bet_df = player_bet_df[player_bet_df['position'] != 'House']
+
+    features_df = player_bet_df[['bull_amount', 'bear_amount']].copy()
+    features_df['position'] = np.where(player_bet_df['position'] == 'Bull', 1, 0)
+
+    candidates = sample_candidates(RandomForestClassifier(),
+                                   {'n_estimators': [100, 200, 500, 1000], 'max_depth': [None, 5, 10, 20],
+                                    'min_samples_leaf': [1, 5, 20, 50]},
+                                   n_iter=30, threshold_list=[0.6, 0.7, 0.8], random_state=0)
+
+    tuning_df = successive_halving(candidates, features_df, player_bet_df)
+    print(tuning_df.head(20))
@@ -50,6 +50,29 @@ def load_players_data(timestamp_from: int, timestamp_to: int,
     return player_bet_df, bet_amount_df
 
 
+def load_bets_timeline(timestamp_from: int, timestamp_to: int,
+                       data_dir: str = '../data/merged_data/') -> pd.DataFrame:
+    """
+    Load the timeline of the players bets from the final_bets_timeline.csv file
+    :param timestamp_from: Timestamp to select the rounds (by start_timestamp) from
+    :param timestamp_to: Timestamp to select the rounds (by start_timestamp) to
+    :param data_dir: Directory where the data is stored, default is '../data/merged_data/'
+    :return: Dataframe with cols: epoch, player_bet, bet_amount (in CAKE tokens), timeStamp, blockNumber, player
+    """
+    bets_df = pd.read_csv(f'{data_dir}final_bets_timeline.csv')
+    rounds_df = pd.read_csv(f'{data_dir}final_player_bet.csv', usecols=['epoch', 'start_timestamp'])
+
+    # Filter by the round start (as in load_players_data), so the rounds at the edges keep all their bets
+    rounds_df = rounds_df[(rounds_df['start_timestamp'] >= timestamp_from) &
+                          (rounds_df['start_timestamp'] <= timestamp_to)]
+    bets_df = bets_df[bets_df['epoch'].isin(rounds_df['epoch'])]
+
+    bets_df[['epoch', 'timeStamp', 'blockNumber']] = bets_df[['epoch', 'timeStamp', 'blockNumber']].astype(int)
+    bets_df['bet_amount'] = bets_df['bet_amount'].astype(float) / 10 ** 18
+
+    return bets_df
+
+
 if __name__ == "__main__":
     time_from_training = int(datetime.datetime(2022, 10, 28, 0, 0).timestamp())
     time_to_training = int(datetime.datetime(2022, 12, 28, 0, 0).timestamp())
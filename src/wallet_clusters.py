@@ -0,0 +1,192 @@
+"""Detect wallets that bet the same side in the same epochs (copy bots, clusters) using sparse matrix products"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+not_players_list = ['epoch', 'start_timestamp', 'lock_timestamp', 'close_timestamp', 'lock_price', 'close_price',
+                    'total_amount', 'bull_amount', 'bear_amount', 'position']
+
+
+def get_wallets(player_bet_df: pd.DataFrame) -> list:
+    """
+    Get the wallet columns of the player bets dataframe
+    :param player_bet_df: Dataframe with player bets
+    :return: List of wallet addresses
+    """
+    return [col for col in player_bet_df.columns.to_list() if col not in not_players_list]
+
+
+def build_signed_bet_matrix(player_bet_df: pd.DataFrame, wallets: list = None) -> sparse.csr_matrix:
+    """
+    Build the sparse epoch x wallet matrix with +1 for a Bull bet, -1 for a Bear bet and no entry when there was no bet
+    :param player_bet_df: Dataframe with player bets
+    :param wallets: Wallets to put in the columns (optional, all wallets by default)
+    :return: Sparse matrix of shape (number of epochs, number of wallets)
+    """
+    if wallets is None:
+        wallets = get_wallets(player_bet_df)
+
+    bets = player_bet_df[wallets]
+
+    bull_rows, bull_cols = np.nonzero((bets == 'Bull').to_numpy())
+    bear_rows, bear_cols = np.nonzero((bets == 'Bear').to_numpy())
+
+    rows = np.concatenate([bull_rows, bear_rows])
+    cols = np.concatenate([bull_cols, bear_cols])
+    values = np.concatenate([np.ones(len(bull_rows), dtype=np.int32), -np.ones(len(bear_rows), dtype=np.int32)])
+
+    return sparse.csr_matrix((values, (rows, cols)), shape=(len(bets), len(wallets)))
+
+
+def get_wallets_agreement(signed_matrix: sparse.csr_matrix, min_common_bets: int = 20) -> pd.DataFrame:
+    """
+    Calculate the pairwise agreement of the wallets on the epochs they both bet in. Only the sparse products
+    M^T M (agreements - disagreements) and |M|^T |M| (common bets) are computed, no dense N x N matrix is created
+    :param signed_matrix: Sparse signed epoch x wallet matrix (see build_signed_bet_matrix)
+    :param min_common_bets: Minimum number of common bets for a pair to be returned
+    :return: Dataframe with the pairs of wallet indexes (wallet_a < wallet_b) and their metrics
+    """
+    signed_matrix = sparse.csc_matrix(signed_matrix)
+    abs_matrix = abs(signed_matrix)
+
+    # Number of epochs where both wallets placed a bet
+    common = sparse.triu(abs_matrix.T @ abs_matrix, k=1).tocoo()
+    # Number of agreements minus number of disagreements on the common epochs
+    signed = sparse.triu(signed_matrix.T @ signed_matrix, k=1).tocsr()
+
+    mask = common.data >= min_common_bets
+    wallet_a, wallet_b, common_bets = common.row[mask], common.col[mask], common.data[mask]
+
+    # Sparse element lookup - missing entries (the same number of agreements and disagreements) are 0
+    net_agreement = np.asarray(signed[wallet_a, wallet_b]).ravel()
+
+    bets_per_wallet = np.asarray(abs_matrix.sum(axis=0)).ravel()
+
+    agreement = (common_bets + net_agreement) / (2 * common_bets)
+    # Share of the less active wallet's bets that were placed in the same epochs as the other wallet
+    overlap = common_bets / np.minimum(bets_per_wallet[wallet_a], bets_per_wallet[wallet_b])
+    # Correlation of the signed bets on the common epochs (1 - always the same side, -1 - always the opposite side)
+    correlation = net_agreement / common_bets
+
+    return pd.DataFrame({'wallet_a': wallet_a, 'wallet_b': wallet_b, 'common_bets': common_bets,
+                         'agreement': agreement, 'overlap': overlap, 'correlation': correlation})
+
+
+def cluster_wallets(player_bet_df: pd.DataFrame, min_agreement: float = 0.95, min_overlap: float = 0.8,
+                    min_common_bets: int = 20) -> pd.DataFrame:
+    """
+    Cluster the wallets that are near-duplicates of each other (the same side in the same epochs). Pairs passing the
+    thresholds are the edges of a graph. The most active wallet of each connected component is its representative and
+    only the wallets passing the thresholds against the representative itself join its cluster, so a wallet similar
+    to two unrelated bots does not chain them together. The rest of the wallets are clustered again the same way
+    :param player_bet_df: Dataframe with player bets
+    :param min_agreement: Minimum share of the common bets placed on the same side
+    :param min_overlap: Minimum share of the less active wallet's bets placed in the same epochs as the other wallet
+    :param min_common_bets: Minimum number of common bets
+    :return: Dataframe with wallet, cluster, total_bets and representative (the most active wallet of the cluster)
+    """
+    wallets = get_wallets(player_bet_df)
+    signed_matrix = build_signed_bet_matrix(player_bet_df, wallets)
+    total_bets = np.asarray(abs(signed_matrix).sum(axis=0)).ravel()
+
+    pairs_df = get_wallets_agreement(signed_matrix, min_common_bets)
+    pairs_df = pairs_df[(pairs_df['agreement'] >= min_agreement) & (pairs_df['overlap'] >= min_overlap)]
+
+    graph = sparse.csr_matrix((np.ones(len(pairs_df)), (pairs_df['wallet_a'], pairs_df['wallet_b'])),
+                              shape=(len(wallets), len(wallets)))
+    graph = graph + graph.T
+
+    representative_index = np.full(len(wallets), -1)
+    unassigned = np.arange(len(wallets))
+    while len(unassigned) > 0:
+        _, labels = connected_components(graph[unassigned][:, unassigned], directed=False)
+
+        # The most active wallet represents the component
+        order = np.argsort(-total_bets[unassigned], kind='stable')
+        _, first_in_component = np.unique(labels[order], return_index=True)
+        candidate_representatives = unassigned[order[first_in_component]][labels]
+
+        joined = (unassigned == candidate_representatives) | \
+            (np.asarray(graph[unassigned, candidate_representatives]).ravel() > 0)
+        representative_index[unassigned[joined]] = candidate_representatives[joined]
+        unassigned = unassigned[~joined]
+
+    clusters_df = pd.DataFrame({'wallet': wallets, 'cluster': pd.factorize(representative_index)[0],
+                                'total_bets': total_bets})
+    clusters_df['representative'] = np.array(wallets, dtype=object)[representative_index]
+    number_of_clusters = clusters_df['cluster'].nunique()
+
+    print(f"Found {number_of_clusters} clusters in {len(wallets)} wallets,"
+          f" {len(wallets) - number_of_clusters} wallets are near-duplicates")
+
+    return clusters_df
+
+
+def get_deduplicated_wallets(clusters_df: pd.DataFrame) -> list:
+    """
+    Get the list of wallets with only one wallet (the representative) for each cluster
+    :param clusters_df: Dataframe with the clusters (see cluster_wallets)
+    :return: List of wallet addresses
+    """
+    return clusters_df.loc[clusters_df['wallet'] == clusters_df['representative'], 'wallet'].to_list()
+
+
+def aggregate_clusters(player_bet_df: pd.DataFrame, bet_amount_df: pd.DataFrame,
+                       clusters_df: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame):
+    """
+    Replace the wallets of each cluster with one column named after the cluster representative. The bet is the side
+    with the higher net number of votes in the cluster and the amount is the sum of the bets placed on that side. Both
+    are NaN when no member bet or the vote is a tie
+    :param player_bet_df: Dataframe with player bets
+    :param bet_amount_df: Dataframe with player bet size
+    :param clusters_df: Dataframe with the clusters (see cluster_wallets)
+    :return: Dataframes with player bets and bet sizes of the clusters, in the same format as the input
+    """
+    wallets = clusters_df['wallet'].to_list()
+    representatives = get_deduplicated_wallets(clusters_df)
+
+    # Wallet x cluster indicator matrix
+    cluster_index = pd.Index(representatives).get_indexer(clusters_df['representative'])
+    membership = sparse.csr_matrix((np.ones(len(wallets)), (np.arange(len(wallets)), cluster_index)),
+                                   shape=(len(wallets), len(representatives)))
+
+    signed_matrix = build_signed_bet_matrix(player_bet_df, wallets)
+    amount_matrix = sparse.csr_matrix(bet_amount_df[wallets].fillna(0).to_numpy())
+
+    votes = (signed_matrix @ membership).toarray()
+    # Sum only the amounts of the members on the voted side
+    bull_amounts = ((signed_matrix > 0).multiply(amount_matrix) @ membership).toarray()
+    bear_amounts = ((signed_matrix < 0).multiply(amount_matrix) @ membership).toarray()
+    amounts = np.where(votes > 0, bull_amounts, np.where(votes < 0, bear_amounts, np.nan))
+
+    cluster_bets = np.where(votes > 0, 'Bull', np.where(votes < 0, 'Bear', None))
+    cluster_bet_df = pd.DataFrame(cluster_bets, columns=representatives, index=player_bet_df.index)
+    cluster_bet_df = cluster_bet_df.astype('category')
+    for col in representatives:
+        cluster_bet_df[col] = cluster_bet_df[col].cat.set_categories(['Bull', 'Bear', 'House'])
+
+    # Bet and amount are NaN in the same rounds (no bet or a tied vote)
+    cluster_amount_df = pd.DataFrame(amounts, columns=representatives, index=bet_amount_df.index)
+
+    player_bet_df = pd.concat([player_bet_df[[col for col in player_bet_df.columns if col in not_players_list]],
+                               cluster_bet_df], axis=1)
+    bet_amount_df = pd.concat([bet_amount_df[[col for col in bet_amount_df.columns if col in not_players_list]],
+                               cluster_amount_df], axis=1)
+
+    return player_bet_df, bet_amount_df
+
+
+if __name__ == "__main__":
+    time_from_training = int(datetime.datetime(2022, 10, 28, 0, 0).timestamp())
+    time_to_training = int(datetime.datetime(2022, 12, 28, 0, 0).timestamp())
+
+    from utils import load_players_data
+
+    player_bet_df, bet_amount_df = load_players_data(time_from_training, time_to_training)
+
+    clusters_df = cluster_wallets(player_bet_df)
+    print(clusters_df[clusters_df.duplicated('cluster', keep=False)].sort_values(['cluster', 'total_bets']))
+    print(f"Deduplicated wallets: {len(get_deduplicated_wallets(clusters_df))}")